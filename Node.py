@@ -1,11 +1,15 @@
 import streamlit as st
+import collections
 import json
+import random
 import uuid
+from html import escape
+from itertools import islice
 from typing import Dict, List, Any, Optional
-import pandas as pd
-import numpy as np
-from dataclasses import dataclass, asdict
+import pyarrow as pa
+from dataclasses import dataclass, asdict, field, fields
 from enum import Enum
+from components_lib import COMPONENTS, CSS, render_component_sidebar
 
 # --------------- Configuration and Styles ---------------
 st.set_page_config(
@@ -15,64 +19,20 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-st.markdown("""
-<style>
-    .main-header {
-        background: linear-gradient(90deg, #667eea 0%, #764ba2 100%);
-        padding: 1rem;
-        border-radius: 10px;
-        color: white;
-        text-align: center;
-        margin-bottom: 2rem;
-    }
-    .sidebar-section {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        padding: 20px 16px 10px 16px;
-        border-radius: 15px;
-        margin-bottom: 20px;
-        box-shadow: 0 4px 15px rgba(0,0,0,0.18);
-    }
-    .component-card {
-        background: white;
-        color: #212121;
-        padding: 12px;
-        border-radius: 9px;
-        margin-bottom: 8px;
-        border-left: 4px solid #4CAF50;
-        box-shadow: 0 2px 4px rgba(50,50,93,.1);
-    }
-    .execution-log {
-        background: #282a36;
-        color: #50fa7b;
-        padding: 13px;
-        border-radius: 8px;
-        font-family: 'Fira Mono', monospace;
-        font-size: 0.9em;
-        margin-bottom: 8px;
-    }
-    .agent-stats {
-        background: linear-gradient(135deg, #00c6ff 0%, #0072ff 100%);
-        color: white;
-        padding: 15px 10px 8px 10px;
-        border-radius: 8px;
-        text-align: center;
-        margin: 8px 0 12px 0;
-    }
-</style>
-""", unsafe_allow_html=True)
+# Re-emitted on every run on purpose: a rerun that skips it would drop the <style> element
+st.markdown(CSS, unsafe_allow_html=True)
 
 # --------------- Data Classes and Enums ---------------
-@dataclass
+@dataclass(slots=True, frozen=True)
 class NodeConfig:
     id: str
     type: str
     name: str
     x: float
     y: float
-    properties: Dict[str, Any]
+    properties: Dict[str, Any] = field(hash=False)
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Connection:
     id: str
     from_node: str
@@ -81,7 +41,7 @@ class Connection:
     to_port: str
     condition: Optional[str] = None
 
-@dataclass
+@dataclass(slots=True)
 class AgentFlow:
     nodes: List[NodeConfig]
     connections: List[Connection]
@@ -99,10 +59,13 @@ class NodeType(Enum):
 def initialize_session_state():
     defaults = {
         'agent_flow': AgentFlow([], [], {}),
+        'agent_flow_version': 0,
+        'session_id': str(uuid.uuid4()),
         'canvas_data': {'nodes': [], 'connections': []},
-        'execution_log': [],
+        'execution_log': collections.deque(maxlen=200),
         'agent_running': False,
         'api_status': 'disconnected',
+        'api_key': '',
         'conversation_history': [],
         'current_agent_config': None,
         'saved_agents': {},
@@ -119,44 +82,89 @@ def initialize_session_state():
 
 initialize_session_state()
 
-# --------------- Component Library ---------------
-components_config = {
-    "Input":     {"color": "#4CAF50", "icon": "📝", "description": "User input capture"},
-    "LLM":       {"color": "#2196F3", "icon": "🤖", "description": "Language model processing"},
-    "Prompt":    {"color": "#9C27B0", "icon": "📋", "description": "Prompt template engine"},
-    "Tool":      {"color": "#FF9800", "icon": "🔧", "description": "External tools and APIs"},
-    "Memory":    {"color": "#607D8B", "icon": "🧠", "description": "Conversation memory"},
-    "Router":    {"color": "#F44336", "icon": "🔀", "description": "Decision routing logic"},
-    "Output":    {"color": "#8BC34A", "icon": "📤", "description": "Final output formatting"}
-}
+# --------------- Rendering Helpers ---------------
+def render_execution_log(entries):
+    """Render log entries as one escaped HTML block."""
+    return "".join(
+        f'<div class="execution-log">{escape(entry).replace(chr(10), "<br>")}</div>'
+        for entry in entries
+    )
+
+# --------------- Cached Tables ---------------
+def table_row(obj):
+    """Shallow field dict of a record; dict fields become JSON text (Arrow can't hold empty structs)."""
+    row = {}
+    for f in fields(obj):
+        value = getattr(obj, f.name)
+        row[f.name] = json.dumps(value) if isinstance(value, dict) else value
+    return row
+
+@st.cache_data(max_entries=100)
+def records_table(session_id: str, version: int, kind: str, _records):
+    """Build an Arrow table of flow records; cached per session and flow version."""
+    return pa.Table.from_pylist([table_row(r) for r in _records])
+
+# --------------- Flow Mutations ---------------
+# Button callbacks: they run before the rerun the click triggers, so the whole page
+# (including the sidebar above the buttons) renders the new state in a single pass.
+def clear_flow():
+    st.session_state.canvas_data = {'nodes': [], 'connections': []}
+    st.session_state.agent_flow = AgentFlow([], [], {})
+    st.session_state.agent_flow_version += 1
+
+def load_agent(name):
+    st.session_state.agent_flow = st.session_state.saved_agents[name]
+    st.session_state.agent_flow_version += 1
+
+def add_demo_nodes():
+    demo_count = st.session_state.demo_count
+    # Draw all coordinates in one call; a single node doesn't need an array at all
+    if demo_count == 1:
+        coords = [(random.random() * 400, random.random() * 400)]
+    else:
+        import numpy as np
+        coords = (np.random.rand(demo_count, 2) * 400).tolist()
+    for x, y in coords:
+        new_id = str(uuid.uuid4())
+        demo_node = NodeConfig(id=new_id, type="Input", name=f"Input_{new_id[:4]}", x=x, y=y, properties={})
+        st.session_state.agent_flow.nodes.append(demo_node)
+        st.session_state.execution_log.append(f"Added demo node: {demo_node.name}")
+    st.session_state.agent_flow_version += 1
+
+def add_demo_connection():
+    conn_id = str(uuid.uuid4())
+    c = Connection(
+        id=conn_id,
+        from_node=st.session_state.agent_flow.nodes[0].id,
+        to_node=st.session_state.agent_flow.nodes[-1].id,
+        from_port="output",
+        to_port="input",
+    )
+    st.session_state.agent_flow.connections.append(c)
+    st.session_state.agent_flow_version += 1
+    st.session_state.execution_log.append(f"Added demo connection from {c.from_node[:4]} to {c.to_node[:4]}")
 
 # --------------- Sidebar UI Section ---------------
 with st.sidebar:
     st.markdown('<div class="sidebar-section">', unsafe_allow_html=True)
     st.markdown("### 🔐 Agent Simulation Controls")
-    st.text_input("OpenAI API Key (Mocked)", type="password", help="Not used, simulation only")
+    with st.form('simulation_controls'):
+        api_key = st.text_input("OpenAI API Key (Mocked)", type="password", help="Not used, simulation only")
+        if st.form_submit_button("Apply"):
+            st.session_state.api_key = api_key
     st.markdown('<span class="status-indicator status-disconnected"></span>API Not Connected', unsafe_allow_html=True)
     st.markdown('</div>', unsafe_allow_html=True)
 
     st.markdown('<div class="sidebar-section">', unsafe_allow_html=True)
     st.markdown("### 🧩 Component Library")
-    for comp_name, comp_info in components_config.items():
-        st.markdown(f"""
-            <div class="component-card">
-                <strong>{comp_info['icon']} {comp_name}</strong><br>
-                <small>{comp_info['description']}</small>
-            </div>
-            """, unsafe_allow_html=True)
+    st.markdown(render_component_sidebar(tuple(COMPONENTS.items())), unsafe_allow_html=True)
     st.markdown('</div>', unsafe_allow_html=True)
 
     st.markdown('<div class="sidebar-section">', unsafe_allow_html=True)
     st.markdown("### ⚙️ Canvas Controls")
     col1, col2 = st.columns(2)
     with col1:
-        if st.button("🗑️ Clear", use_container_width=True):
-            st.session_state.canvas_data = {'nodes': [], 'connections': []}
-            st.session_state.agent_flow = AgentFlow([], [], {})
-            st.rerun()
+        st.button("🗑️ Clear", use_container_width=True, on_click=clear_flow)
     with col2:
         agent_name = st.text_input("Agent Name", value="MyAgent")
         if st.button("💾 Save", use_container_width=True):
@@ -164,16 +172,13 @@ with st.sidebar:
             st.success("Agent saved!")
     if st.session_state.saved_agents:
         selected_agent = st.selectbox("Load Saved Agent", [""] + list(st.session_state.saved_agents.keys()))
-        if selected_agent and st.button("📂 Load Agent"):
-            st.session_state.agent_flow = st.session_state.saved_agents[selected_agent]
-            st.success("Loaded agent!")
-            st.rerun()
+        if selected_agent:
+            st.button("📂 Load Agent", on_click=load_agent, args=(selected_agent,))
     st.markdown('</div>', unsafe_allow_html=True)
 
     st.markdown('<div class="sidebar-section">', unsafe_allow_html=True)
     st.markdown("### 📝 Execution Log")
-    for log_entry in reversed(st.session_state.execution_log[-10:]):
-        st.markdown(f'<div class="execution-log">{log_entry}</div>', unsafe_allow_html=True)
+    st.markdown(render_execution_log(islice(reversed(st.session_state.execution_log), 10)), unsafe_allow_html=True)
     st.markdown('</div>', unsafe_allow_html=True)
 
 # --------------- Main Header and Tabs ---------------
@@ -184,12 +189,13 @@ tab1, tab2, tab3, tab4 = st.tabs(["🎨 Visual Builder", "⚙️ Configuration",
 with tab1:
     st.subheader("🎨 Visual Agent Flow")
     st.write("Below is a summary of your current agent configuration (nodes and connections):")
-    nodes_df = pd.DataFrame([asdict(n) for n in st.session_state.agent_flow.nodes])
-    conns_df = pd.DataFrame([asdict(c) for c in st.session_state.agent_flow.connections])
+    flow_key = (st.session_state.session_id, st.session_state.agent_flow_version)
+    nodes_table = records_table(*flow_key, "nodes", st.session_state.agent_flow.nodes)
+    conns_table = records_table(*flow_key, "connections", st.session_state.agent_flow.connections)
     st.write("**Nodes**:")
-    st.dataframe(nodes_df if not nodes_df.empty else pd.DataFrame([{'info':'No nodes yet'}]))
+    st.dataframe(nodes_table if nodes_table.num_rows else pa.table({'info': ['No nodes yet']}))
     st.write("**Connections**:")
-    st.dataframe(conns_df if not conns_df.empty else pd.DataFrame([{'info':'No connections yet'}]))
+    st.dataframe(conns_table if conns_table.num_rows else pa.table({'info': ['No connections yet']}))
 
 with tab2:
     st.subheader("⚙️ Full Agent Builder Configuration")
@@ -199,8 +205,7 @@ with tab3:
     st.subheader("🚀 Run Agent Simulation")
     input_prompt = st.text_area("User Prompt", "What is the capital of France?", key="prompt_input")
     if st.button("▶️ Simulate Run"):
-        from random import choice
-        simulated_response = choice([
+        simulated_response = random.choice([
             "The capital of France is Paris.",
             "Paris is the capital city of France.",
             "France's capital is Paris."
@@ -228,42 +233,25 @@ with tab3:
 with tab4:
     st.subheader("📊 Run Analytics and History")
     stats = st.session_state.execution_stats
-    chart_data = pd.DataFrame({
-        "Runs": [stats['total_runs']],
-        "Successes": [stats['successful_runs']],
-        "Failures": [stats['failed_runs']]
+    chart_data = pa.table({
+        "metric": ["Runs", "Successes", "Failures"],
+        "count": [stats['total_runs'], stats['successful_runs'], stats['failed_runs']]
     })
-    st.bar_chart(chart_data.transpose())
+    st.bar_chart(chart_data, x="metric", y="count")
     st.write("**Last 10 log entries:**")
-    for log_entry in reversed(st.session_state.execution_log[-10:]):
-        st.markdown(f'<div class="execution-log">{log_entry}</div>', unsafe_allow_html=True)
+    st.markdown(render_execution_log(islice(reversed(st.session_state.execution_log), 10)), unsafe_allow_html=True)
 
 # --------------- Example: Add Node/Connection Directly (for demo) ---------------
 with st.expander("🧪 For Demo: Add Demo Node/Connection"):
     col_a, col_b = st.columns(2)
     with col_a:
-        if st.button("Add Demo Node"):
-            new_id = str(uuid.uuid4())
-            demo_node = NodeConfig(id=new_id, type="Input", name=f"Input_{new_id[:4]}", x=np.random.rand()*400, y=np.random.rand()*400, properties={})
-            st.session_state.agent_flow.nodes.append(demo_node)
-            st.session_state.execution_log.append(f"Added demo node: {demo_node.name}")
-            st.rerun()
+        st.number_input("Demo nodes to add", min_value=1, max_value=50, value=1, key="demo_count")
+        st.button("Add Demo Node", on_click=add_demo_nodes)
     with col_b:
-        if st.button("Add Demo Connection"):
-            if len(st.session_state.agent_flow.nodes) >= 2:
-                conn_id = str(uuid.uuid4())
-                c = Connection(
-                    id=conn_id,
-                    from_node=st.session_state.agent_flow.nodes.id,
-                    to_node=st.session_state.agent_flow.nodes[-1].id,
-                    from_port="output",
-                    to_port="input",
-                )
-                st.session_state.agent_flow.connections.append(c)
-                st.session_state.execution_log.append(f"Added demo connection from {c.from_node[:4]} to {c.to_node[:4]}")
-                st.rerun()
-            else:
-                st.warning("Add at least 2 nodes first.")
+        if len(st.session_state.agent_flow.nodes) >= 2:
+            st.button("Add Demo Connection", on_click=add_demo_connection)
+        elif st.button("Add Demo Connection"):
+            st.warning("Add at least 2 nodes first.")
 
 # --------------- Footer ---------------
 st.markdown(
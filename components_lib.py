@@ -0,0 +1,123 @@
+import streamlit as st
+import orjson
+from string import Template
+from typing import Dict, Any
+
+# Shared by Node.py and 1Node.py: component library, styles and cached builders
+
+# --------------- Styles ---------------
+CSS = """
+<style>
+    .main-header {
+        background: linear-gradient(90deg, #667eea 0%, #764ba2 100%);
+        padding: 1rem;
+        border-radius: 10px;
+        color: white;
+        text-align: center;
+        margin-bottom: 2rem;
+    }
+    .sidebar-section {
+        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+        color: white;
+        padding: 20px 16px 10px 16px;
+        border-radius: 15px;
+        margin-bottom: 20px;
+        box-shadow: 0 4px 15px rgba(0,0,0,0.18);
+    }
+    .component-card {
+        background: white;
+        color: #212121;
+        padding: 12px;
+        border-radius: 9px;
+        margin-bottom: 8px;
+        border-left: 4px solid #4CAF50;
+        box-shadow: 0 2px 4px rgba(50,50,93,.1);
+    }
+    .execution-log {
+        background: #282a36;
+        color: #50fa7b;
+        padding: 13px;
+        border-radius: 8px;
+        font-family: 'Fira Mono', monospace;
+        font-size: 0.9em;
+        margin-bottom: 8px;
+    }
+    .agent-stats {
+        background: linear-gradient(135deg, #00c6ff 0%, #0072ff 100%);
+        color: white;
+        padding: 15px 10px 8px 10px;
+        border-radius: 8px;
+        text-align: center;
+        margin: 8px 0 12px 0;
+    }
+    .json-output {
+        background-color: #f1f3f4;
+        padding: 15px;
+        border-radius: 5px;
+        border-left: 4px solid #4CAF50;
+    }
+</style>
+"""
+
+# --------------- Component Library ---------------
+COMPONENTS = {
+    "Input":     {"color": "#4CAF50", "icon": "📝", "description": "User input capture"},
+    "LLM":       {"color": "#2196F3", "icon": "🤖", "description": "Language model processing"},
+    "Prompt":    {"color": "#9C27B0", "icon": "📋", "description": "Prompt template engine"},
+    "Tool":      {"color": "#FF9800", "icon": "🔧", "description": "External tools and APIs"},
+    "Memory":    {"color": "#607D8B", "icon": "🧠", "description": "Conversation memory"},
+    "Router":    {"color": "#F44336", "icon": "🔀", "description": "Decision routing logic"},
+    "Output":    {"color": "#8BC34A", "icon": "📤", "description": "Final output formatting"}
+}
+
+# Icon per component type, for per-node lookups
+COMPONENT_ICONS = {comp_name: comp_info['icon'] for comp_name, comp_info in COMPONENTS.items()}
+
+CARD_TPL = Template('<div class="component-card"><strong>$icon $name</strong><br><small>$desc</small></div>')
+
+@st.cache_data
+def render_component_sidebar(components_items):
+    """Build the component library cards once as a single HTML block."""
+    return "\n".join(
+        CARD_TPL.substitute(icon=comp_info['icon'], name=comp_name, desc=comp_info['description'])
+        for comp_name, comp_info in components_items
+    )
+
+# --------------- Agent Configuration ---------------
+@st.cache_data(max_entries=100)
+def build_agent_config(canvas_data_json: str) -> Dict[str, Any]:
+    """Generate the LangChain-like configuration; cached on the canonical canvas JSON."""
+    canvas_data = orjson.loads(canvas_data_json)
+    agent_config = {
+        "agent_type": "custom_visual_agent",
+        "created_at": "2024-01-01T00:00:00Z",
+        "nodes": {},
+        "flow": []
+    }
+    
+    # Process nodes
+    for node in canvas_data['nodes']:
+        agent_config["nodes"][node['id']] = {
+            "type": node['type'].lower(),
+            "name": node.get('name', node['type']),
+            "position": {"x": node['x'], "y": node['y']},
+            "config": {}
+        }
+        
+        # Add type-specific config
+        if 'model' in node:
+            agent_config["nodes"][node['id']]["config"]["model"] = node['model']
+        if 'temperature' in node:
+            agent_config["nodes"][node['id']]["config"]["temperature"] = node['temperature']
+        if 'tool_type' in node:
+            agent_config["nodes"][node['id']]["config"]["tool_type"] = node['tool_type']
+    
+    # Process connections
+    for conn in canvas_data['connections']:
+        agent_config["flow"].append({
+            "from": conn['from'],
+            "to": conn['to'],
+            "condition": "default"
+        })
+    
+    return agent_config